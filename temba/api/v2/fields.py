@@ -76,6 +76,33 @@ class TranslatableField(serializers.Field):
         return data, base_language
 
 
+class MappedField(serializers.ReadOnlyField):
+    """
+    A read-only field which maps a db code to an API code using a constant mapping, e.g. from extract_constants
+    """
+    def __init__(self, mapping, **kwargs):
+        super(MappedField, self).__init__(**kwargs)
+
+        # bind the lookup directly to avoid a method dispatch per object
+        self.to_representation = mapping.get
+
+
+class AttachmentsField(serializers.ReadOnlyField):
+    """
+    A read-only field which serializes parsed message attachments, e.g. from Msg.get_attachments
+    """
+    def to_representation(self, obj):
+        return [a.as_json() for a in obj]
+
+
+class MediaField(serializers.ReadOnlyField):
+    """
+    A read-only field which serializes the first of a message's raw attachments (deprecated)
+    """
+    def to_representation(self, obj):
+        return obj[0] if obj else None
+
+
 class LimitedListField(serializers.ListField):
     """
     A list field which can be only be written to with a limited number of items
@@ -100,7 +127,7 @@ class URNField(serializers.CharField):
     max_length = 255
 
     def to_representation(self, obj):
-        if self.context['org'].is_anon:
+        if self.context['is_anon']:
             return None
         else:
             return six.text_type(obj)
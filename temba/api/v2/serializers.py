@@ -1,30 +1,39 @@
 from __future__ import absolute_import, unicode_literals
 
 import json
+import pytz
 import six
 
+from collections import OrderedDict
+from django.db.models import Prefetch, prefetch_related_objects
 from rest_framework import serializers
 from temba.api.models import Resthook, ResthookSubscriber, WebHookEvent
 from temba.campaigns.models import Campaign, CampaignEvent, EventFire
 from temba.channels.models import Channel, ChannelEvent
-from temba.contacts.models import Contact, ContactField, ContactGroup
-from temba.flows.models import Flow, FlowRun, FlowStart
+from temba.contacts.models import Contact, ContactField, ContactGroup, ContactURN
+from temba.flows.models import Flow, FlowLabel, FlowRun, FlowStart
 from temba.locations.models import AdminBoundary
-from temba.msgs.models import Broadcast, Msg, Label, STATUS_CONFIG, INCOMING, OUTGOING, INBOX, FLOW, IVR, PENDING
-from temba.msgs.models import QUEUED
+from temba.msgs.models import Broadcast, Msg, Label, STATUS_CONFIG, INCOMING, OUTGOING, INBOX, FLOW, IVR
 from temba.msgs.tasks import send_broadcast_task
-from temba.utils import datetime_to_json_date, on_transaction_commit
+from temba.utils import on_transaction_commit
 from temba.values.models import Value
 
 from . import fields
 from .validators import UniqueForOrgValidator
 
 
+# equivalent to datetime_to_json_date(..., micros=True) but without the slicing and concatenation
+DATETIME_FORMAT = '%Y-%m-%dT%H:%M:%S.%fZ'
+
+
 def format_datetime(value):
     """
     Datetime fields are formatted with microsecond accuracy for v2
     """
-    return datetime_to_json_date(value, micros=True) if value else None
+    if value is None:
+        return None
+
+    return value.astimezone(pytz.utc).strftime(DATETIME_FORMAT)
 
 
 def extract_constants(config, reverse=False):
@@ -37,10 +46,24 @@ def extract_constants(config, reverse=False):
         return {t[0]: t[2] for t in config}
 
 
+class ReadListSerializer(serializers.ListSerializer):
+    """
+    List serializer which prefetches the relations declared by its child serializer before serializing any items.
+    Relations which have already been fetched, e.g. by the view's queryset, won't be fetched again.
+    """
+    def to_representation(self, data):
+        if self.child.prefetch and isinstance(data, list):
+            prefetch_related_objects(data, *self.child.prefetch)
+
+        return super(ReadListSerializer, self).to_representation(data)
+
+
 class ReadSerializer(serializers.ModelSerializer):
     """
     We deviate slightly from regular REST framework usage with distinct serializers for reading and writing
     """
+    prefetch = ()  # relations to prefetch when serializing a list with ReadListSerializer
+
     def save(self, **kwargs):  # pragma: no cover
         raise ValueError("Can't call save on a read serializer")
 
@@ -81,10 +104,7 @@ class AdminBoundaryReadSerializer(ReadSerializer):
         return [alias.name for alias in obj.aliases.all()]
 
     def get_geometry(self, obj):
-        if self.context['include_geometry'] and obj.simplified_geometry:
-            return json.loads(obj.simplified_geometry.geojson)
-        else:
-            return None
+        return obj.geometry_json if self.context['include_geometry'] else None  # cached on the object by the view
 
     class Meta:
         model = AdminBoundary
@@ -98,7 +118,7 @@ class BroadcastReadSerializer(ReadSerializer):
     groups = fields.ContactGroupField(many=True)
 
     def get_urns(self, obj):
-        if self.context['org'].is_anon:
+        if self.context['is_anon']:
             return None
         else:
             return [six.text_type(urn) for urn in obj.urns.all()]
@@ -126,12 +146,13 @@ class BroadcastWriteSerializer(WriteSerializer):
         Create a new broadcast to send out
         """
         recipients = self.validated_data.get('contacts', []) + self.validated_data.get('groups', [])
+        urns = self.validated_data.get('urns', [])
+
+        # create contacts for URNs if necessary
+        urn_contacts = Contact.bulk_get_or_create(self.context['org'], self.context['user'], urns)
 
-        for urn in self.validated_data.get('urns', []):
-            # create contacts for URNs if necessary
-            contact = Contact.get_or_create(self.context['org'], self.context['user'], urns=[urn])
-            contact_urn = contact.urn_objects[urn]
-            recipients.append(contact_urn)
+        for urn, contact in zip(urns, urn_contacts):
+            recipients.append(contact.urn_objects[urn])
 
         text, base_language = self.validated_data['text']
 
@@ -151,14 +172,11 @@ class BroadcastWriteSerializer(WriteSerializer):
 class ChannelEventReadSerializer(ReadSerializer):
     TYPES = extract_constants(ChannelEvent.TYPE_CONFIG)
 
-    type = serializers.SerializerMethodField()
+    type = fields.MappedField(TYPES, source='event_type')
     contact = fields.ContactField()
     channel = fields.ChannelField()
     extra = serializers.SerializerMethodField()
 
-    def get_type(self, obj):
-        return self.TYPES.get(obj.event_type)
-
     def get_extra(self, obj):
         if obj.extra:
             return obj.extra_json()
@@ -207,7 +225,7 @@ class CampaignEventReadSerializer(ReadSerializer):
     campaign = fields.CampaignField()
     flow = serializers.SerializerMethodField()
     relative_to = fields.ContactFieldField()
-    unit = serializers.SerializerMethodField()
+    unit = fields.MappedField(UNITS)
 
     def get_flow(self, obj):
         if obj.event_type == CampaignEvent.TYPE_FLOW:
@@ -215,9 +233,6 @@ class CampaignEventReadSerializer(ReadSerializer):
         else:
             return None
 
-    def get_unit(self, obj):
-        return self.UNITS.get(obj.unit)
-
     class Meta:
         model = CampaignEvent
         fields = ('uuid', 'campaign', 'relative_to', 'offset', 'unit', 'delivery_hour', 'flow', 'message', 'created_on')
@@ -228,7 +243,7 @@ class CampaignEventWriteSerializer(WriteSerializer):
 
     campaign = fields.CampaignField(required=True)
     offset = serializers.IntegerField(required=True)
-    unit = serializers.ChoiceField(required=True, choices=UNITS.keys())
+    unit = serializers.ChoiceField(required=True, choices=tuple(UNITS.keys()))
     delivery_hour = serializers.IntegerField(required=True, min_value=-1, max_value=23)
     relative_to = fields.ContactFieldField(required=True)
     message = fields.TranslatableField(required=False, max_length=Msg.MAX_TEXT_LEN)
@@ -317,7 +332,7 @@ class ChannelReadSerializer(ReadSerializer):
     device = serializers.SerializerMethodField()
 
     def get_country(self, obj):
-        return six.text_type(obj.country) if obj.country else None
+        return obj.country.code if obj.country else None
 
     def get_device(self, obj):
         if obj.channel_type != Channel.TYPE_ANDROID:
@@ -336,37 +351,80 @@ class ChannelReadSerializer(ReadSerializer):
         fields = ('uuid', 'name', 'address', 'country', 'device', 'last_seen', 'created_on')
 
 
+class ContactListSerializer(ReadListSerializer):
+    """
+    List serializer for contacts which fetches and serializes the field values of all contacts in a single query
+    """
+    def to_representation(self, data):
+        if isinstance(data, list):
+            self.context['field_values'] = self.get_field_values(data)
+
+        return super(ContactListSerializer, self).to_representation(data)
+
+    def get_field_values(self, contacts):
+        contacts = [c for c in contacts if c.is_active]
+        fields_by_id = {f.id: f for f in self.context['contact_fields']}
+        serialize = Contact.serialize_field_value
+
+        # every contact has every field, even if they don't have a value for it
+        no_values = {f.key: None for f in fields_by_id.values()}
+        field_values = {c.id: dict(no_values) for c in contacts}
+
+        values = Value.objects.filter(contact_id__in=field_values.keys(), contact_field_id__in=fields_by_id.keys())
+        for value in values.select_related('location_value'):
+            field = fields_by_id[value.contact_field_id]
+            field_values[value.contact_id][field.key] = serialize(field, value)
+
+        return field_values
+
+
 class ContactReadSerializer(ReadSerializer):
-    name = serializers.SerializerMethodField()
-    language = serializers.SerializerMethodField()
+    prefetch = (
+        Prefetch('all_groups', queryset=ContactGroup.user_groups.only('uuid', 'name').order_by('pk'),
+                 to_attr='prefetched_user_groups'),
+    )
+
+    name = serializers.ReadOnlyField()
+    language = serializers.ReadOnlyField()
     urns = serializers.SerializerMethodField()
     groups = serializers.SerializerMethodField()
     fields = serializers.SerializerMethodField('get_contact_fields')
-    blocked = serializers.SerializerMethodField()
-    stopped = serializers.SerializerMethodField()
-
-    def get_name(self, obj):
-        return obj.name if obj.is_active else None
-
-    def get_language(self, obj):
-        return obj.language if obj.is_active else None
+    blocked = serializers.ReadOnlyField(source='is_blocked')
+    stopped = serializers.ReadOnlyField(source='is_stopped')
+
+    def to_representation(self, instance):
+        # deleted contacts only have their UUID and dates serialized so skip all the other fields
+        if not instance.is_active:
+            return OrderedDict([
+                ('uuid', instance.uuid),
+                ('name', None),
+                ('language', None),
+                ('urns', []),
+                ('groups', []),
+                ('fields', {}),
+                ('blocked', None),
+                ('stopped', None),
+                ('created_on', self.fields['created_on'].to_representation(instance.created_on)),
+                ('modified_on', self.fields['modified_on'].to_representation(instance.modified_on)),
+            ])
+
+        return super(ContactReadSerializer, self).to_representation(instance)
 
     def get_urns(self, obj):
-        if self.context['org'].is_anon or not obj.is_active:
+        if self.context['is_anon']:
             return []
 
         return [six.text_type(urn) for urn in obj.get_urns()]
 
     def get_groups(self, obj):
-        if not obj.is_active:
-            return []
-
         groups = obj.prefetched_user_groups if hasattr(obj, 'prefetched_user_groups') else obj.user_groups.all()
         return [{'uuid': g.uuid, 'name': g.name} for g in groups]
 
     def get_contact_fields(self, obj):
-        if not obj.is_active:
-            return {}
+        # values may have been fetched for all contacts by the list serializer
+        field_values = self.context.get('field_values')
+        if field_values is not None and obj.id in field_values:
+            return field_values[obj.id]
 
         fields = {}
         for contact_field in self.context['contact_fields']:
@@ -374,16 +432,11 @@ class ContactReadSerializer(ReadSerializer):
             fields[contact_field.key] = Contact.serialize_field_value(contact_field, value)
         return fields
 
-    def get_blocked(self, obj):
-        return obj.is_blocked if obj.is_active else None
-
-    def get_stopped(self, obj):
-        return obj.is_stopped if obj.is_active else None
-
     class Meta:
         model = Contact
         fields = ('uuid', 'name', 'language', 'urns', 'groups', 'fields', 'blocked', 'stopped',
                   'created_on', 'modified_on')
+        list_serializer_class = ContactListSerializer
 
 
 class ContactWriteSerializer(WriteSerializer):
@@ -404,11 +457,9 @@ class ContactWriteSerializer(WriteSerializer):
         return value
 
     def validate_fields(self, value):
-        valid_keys = {f.key for f in self.context['contact_fields']}
-
-        for field_key, field_val in value.items():
-            if field_key not in valid_keys:
-                raise serializers.ValidationError("Invalid contact field key: %s" % field_key)
+        invalid_keys = set(value) - self.context['valid_field_keys']
+        if invalid_keys:
+            raise serializers.ValidationError("Invalid contact field key: %s" % ", ".join(sorted(invalid_keys)))
 
         return value
 
@@ -425,8 +476,11 @@ class ContactWriteSerializer(WriteSerializer):
 
         # if creating a contact, URNs can't belong to other contacts
         if not self.instance:
+            existing_urns = ContactURN.bulk_lookup(org, value)
+
             for urn in value:
-                if Contact.from_urn(org, urn):
+                existing_urn = existing_urns.get(urn)
+                if existing_urn and existing_urn.contact and existing_urn.contact.is_active:
                     raise serializers.ValidationError("URN belongs to another contact: %s" % urn)
 
         return value
@@ -472,7 +526,7 @@ class ContactWriteSerializer(WriteSerializer):
 
         # update our fields
         if custom_fields is not None:
-            for key, value in six.iteritems(custom_fields):
+            for key, value in custom_fields.items():
                 self.instance.set_field(self.context['user'], key, value)
 
         # update our groups
@@ -485,10 +539,7 @@ class ContactWriteSerializer(WriteSerializer):
 class ContactFieldReadSerializer(ReadSerializer):
     VALUE_TYPES = extract_constants(Value.TYPE_CONFIG)
 
-    value_type = serializers.SerializerMethodField()
-
-    def get_value_type(self, obj):
-        return self.VALUE_TYPES.get(obj.value_type)
+    value_type = fields.MappedField(VALUE_TYPES)
 
     class Meta:
         model = ContactField
@@ -501,7 +552,7 @@ class ContactFieldWriteSerializer(WriteSerializer):
     label = serializers.CharField(required=True, max_length=ContactField.MAX_LABEL_LEN, validators=[
         UniqueForOrgValidator(ContactField.objects.filter(is_active=True), ignore_case=True)
     ])
-    value_type = serializers.ChoiceField(required=True, choices=VALUE_TYPES.keys())
+    value_type = serializers.ChoiceField(required=True, choices=tuple(VALUE_TYPES.keys()))
 
     def validate_label(self, value):
         if not ContactField.is_valid_label(value):
@@ -539,11 +590,7 @@ class ContactFieldWriteSerializer(WriteSerializer):
 
 
 class ContactGroupReadSerializer(ReadSerializer):
-    count = serializers.SerializerMethodField()
-
-    def get_count(self, obj):
-        # count may be cached on the object
-        return obj.count if hasattr(obj, 'count') else obj.get_member_count()
+    count = serializers.ReadOnlyField()  # cached on the object by the view
 
     class Meta:
         model = ContactGroup
@@ -638,6 +685,10 @@ class ContactBulkActionSerializer(WriteSerializer):
 
 
 class FlowReadSerializer(ReadSerializer):
+    prefetch = (
+        Prefetch('labels', queryset=FlowLabel.objects.only('uuid', 'name')),
+    )
+
     archived = serializers.ReadOnlyField(source='is_archived')
     labels = serializers.SerializerMethodField()
     expires = serializers.ReadOnlyField(source='expires_after_minutes')
@@ -647,17 +698,18 @@ class FlowReadSerializer(ReadSerializer):
         return [{'uuid': l.uuid, 'name': l.name} for l in obj.labels.all()]
 
     def get_runs(self, obj):
-        stats = obj.get_run_stats()
+        totals = obj.run_counts  # cached on the object by the view
         return {
-            'active': stats['active'],
-            'completed': stats['completed'],
-            'interrupted': stats['interrupted'],
-            'expired': stats['expired']
+            'active': totals[FlowRun.STATE_ACTIVE],
+            'completed': totals[FlowRun.EXIT_TYPE_COMPLETED],
+            'interrupted': totals[FlowRun.EXIT_TYPE_INTERRUPTED],
+            'expired': totals[FlowRun.EXIT_TYPE_EXPIRED]
         }
 
     class Meta:
         model = Flow
         fields = ('uuid', 'name', 'archived', 'labels', 'expires', 'runs', 'created_on', 'modified_on')
+        list_serializer_class = ReadListSerializer
 
 
 class FlowRunReadSerializer(ReadSerializer):
@@ -672,13 +724,13 @@ class FlowRunReadSerializer(ReadSerializer):
     start = serializers.SerializerMethodField()
     path = serializers.SerializerMethodField()
     values = serializers.SerializerMethodField()
-    exit_type = serializers.SerializerMethodField()
+    exit_type = fields.MappedField(EXIT_TYPES)
 
     def get_start(self, obj):
         return {'uuid': str(obj.start.uuid)} if obj.start else None
 
     def get_path(self, obj):
-        return [{'node': s.step_uuid, 'time': format_datetime(s.arrived_on)} for s in obj.steps.all()]
+        return obj.path_json  # annotated by the view
 
     def get_values(self, obj):
         values = {}
@@ -692,9 +744,6 @@ class FlowRunReadSerializer(ReadSerializer):
 
         return values
 
-    def get_exit_type(self, obj):
-        return self.EXIT_TYPES.get(obj.exit_type)
-
     class Meta:
         model = FlowRun
         fields = ('id', 'flow', 'contact', 'start', 'responded', 'path', 'values',
@@ -710,14 +759,11 @@ class FlowStartReadSerializer(ReadSerializer):
     }
 
     flow = fields.FlowField()
-    status = serializers.SerializerMethodField()
+    status = fields.MappedField(STATUSES)
     groups = fields.ContactGroupField(many=True)
     contacts = fields.ContactField(many=True)
     extra = serializers.SerializerMethodField()
 
-    def get_status(self, obj):
-        return FlowStartReadSerializer.STATUSES.get(obj.status)
-
     def get_extra(self, obj):
         if not obj.extra:
             return None
@@ -759,9 +805,7 @@ class FlowStartWriteSerializer(WriteSerializer):
         extra = self.validated_data.get('extra')
 
         # convert URNs to contacts
-        for urn in urns:
-            contact = Contact.get_or_create(self.context['org'], self.context['user'], urns=[urn])
-            contacts.append(contact)
+        contacts += Contact.bulk_get_or_create(self.context['org'], self.context['user'], urns)
 
         # ok, let's go create our flow start, the actual starting will happen in our view
         return FlowStart.create(self.validated_data['flow'], self.context['user'],
@@ -770,11 +814,7 @@ class FlowStartWriteSerializer(WriteSerializer):
 
 
 class LabelReadSerializer(ReadSerializer):
-    count = serializers.SerializerMethodField()
-
-    def get_count(self, obj):
-        # count may be cached on the object
-        return obj.count if hasattr(obj, 'count') else obj.get_visible_count()
+    count = serializers.ReadOnlyField()  # cached on the object by the view
 
     class Meta:
         model = Label
@@ -823,43 +863,49 @@ class MsgReadSerializer(ReadSerializer):
         IVR: 'ivr'
     }
 
-    broadcast = serializers.SerializerMethodField()
+    ARCHIVED = {v: v == Msg.VISIBILITY_ARCHIVED for v in VISIBILITIES}
+
+    broadcast = serializers.ReadOnlyField(source='broadcast_id')
     contact = fields.ContactField()
     urn = fields.URNField(source='contact_urn')
     channel = fields.ChannelField()
-    direction = serializers.SerializerMethodField()
-    type = serializers.SerializerMethodField()
-    attachments = serializers.SerializerMethodField()
-    status = serializers.SerializerMethodField()
-    archived = serializers.SerializerMethodField()
-    visibility = serializers.SerializerMethodField()
+    direction = fields.MappedField(DIRECTIONS)
+    type = fields.MappedField(MSG_TYPES, source='msg_type')
+    attachments = fields.AttachmentsField(source='get_attachments')
+    status = fields.MappedField(STATUSES, source='effective_status')  # annotated by the view
+    archived = fields.MappedField(ARCHIVED, source='visibility')
+    visibility = fields.MappedField(VISIBILITIES)
     labels = fields.LabelField(many=True)
-    media = serializers.SerializerMethodField()  # deprecated
-
-    def get_broadcast(self, obj):
-        return obj.broadcast_id
-
-    def get_direction(self, obj):
-        return self.DIRECTIONS.get(obj.direction)
-
-    def get_type(self, obj):
-        return self.MSG_TYPES.get(obj.msg_type)
-
-    def get_status(self, obj):
-        # PENDING and QUEUED are same as far as users are concerned
-        return self.STATUSES.get(QUEUED if obj.status == PENDING else obj.status)
-
-    def get_attachments(self, obj):
-        return [a.as_json() for a in obj.get_attachments()]
-
-    def get_media(self, obj):
-        return obj.attachments[0] if obj.attachments else None
+    media = fields.MediaField(source='attachments')  # deprecated
 
-    def get_archived(self, obj):
-        return obj.visibility == Msg.VISIBILITY_ARCHIVED
-
-    def get_visibility(self, obj):
-        return self.VISIBILITIES.get(obj.visibility)
+    def to_representation(self, instance):
+        """
+        Messages are the most numerous objects we serialize so rather than have the REST framework iterate over the
+        fields, resolving the source of each, we read every attribute directly and pass it to the declared field.
+        """
+        fields = self.fields
+        contact_urn, channel, visibility = instance.contact_urn, instance.channel, instance.visibility
+        sent_on, modified_on = instance.sent_on, instance.modified_on
+
+        return OrderedDict([
+            ('id', instance.id),
+            ('broadcast', instance.broadcast_id),
+            ('contact', fields['contact'].to_representation(instance.contact)),
+            ('urn', fields['urn'].to_representation(contact_urn) if contact_urn is not None else None),
+            ('channel', fields['channel'].to_representation(channel) if channel is not None else None),
+            ('direction', fields['direction'].to_representation(instance.direction)),
+            ('type', fields['type'].to_representation(instance.msg_type)),
+            ('status', fields['status'].to_representation(instance.effective_status)),
+            ('archived', fields['archived'].to_representation(visibility)),
+            ('visibility', fields['visibility'].to_representation(visibility)),
+            ('text', instance.text),
+            ('labels', fields['labels'].to_representation(instance.labels.all())),
+            ('attachments', fields['attachments'].to_representation(instance.get_attachments())),
+            ('created_on', fields['created_on'].to_representation(instance.created_on)),
+            ('sent_on', fields['sent_on'].to_representation(sent_on) if sent_on else None),
+            ('modified_on', fields['modified_on'].to_representation(modified_on) if modified_on else None),
+            ('media', fields['media'].to_representation(instance.attachments)),
+        ])
 
     class Meta:
         model = Msg
@@ -938,10 +984,7 @@ class MsgBulkActionSerializer(WriteSerializer):
 
 
 class ResthookReadSerializer(ReadSerializer):
-    resthook = serializers.SerializerMethodField()
-
-    def get_resthook(self, obj):
-        return obj.slug
+    resthook = serializers.ReadOnlyField(source='slug')
 
     class Meta:
         model = Resthook
@@ -949,10 +992,7 @@ class ResthookReadSerializer(ReadSerializer):
 
 
 class ResthookSubscriberReadSerializer(ReadSerializer):
-    resthook = serializers.SerializerMethodField()
-
-    def get_resthook(self, obj):
-        return obj.resthook.slug
+    resthook = serializers.ReadOnlyField(source='resthook.slug')
 
     class Meta:
         model = ResthookSubscriber
@@ -986,12 +1026,9 @@ class ResthookSubscriberWriteSerializer(WriteSerializer):
 
 
 class WebHookEventReadSerializer(ReadSerializer):
-    resthook = serializers.SerializerMethodField()
+    resthook = serializers.ReadOnlyField(source='resthook.slug')
     data = serializers.SerializerMethodField()
 
-    def get_resthook(self, obj):
-        return obj.resthook.slug
-
     def get_data(self, obj):
         decoded = json.loads(obj.data)
 
@@ -19,10 +19,10 @@ from rest_framework import serializers
 from rest_framework.test import APIClient
 from temba.campaigns.models import Campaign, CampaignEvent, EventFire
 from temba.channels.models import Channel, ChannelEvent
-from temba.contacts.models import Contact, ContactGroup, ContactField
+from temba.contacts.models import Contact, ContactGroup, ContactField, ContactURN
 from temba.flows.models import Flow, FlowRun, FlowLabel, FlowStart, ReplyAction
 from temba.locations.models import BoundaryAlias
-from temba.msgs.models import Broadcast, Label, Msg
+from temba.msgs.models import Attachment, Broadcast, Label, Msg
 from temba.orgs.models import Language
 from temba.tests import TembaTest, AnonymousOrg
 from temba.values.models import Value
@@ -30,7 +30,7 @@ from uuid import uuid4
 from urllib import quote_plus
 from temba.api.models import APIToken, Resthook, WebHookEvent
 from . import fields
-from .serializers import format_datetime
+from .serializers import format_datetime, MsgReadSerializer
 
 
 NUM_BASE_REQUEST_QUERIES = 7  # number of db queries required for any API request
@@ -250,6 +250,68 @@ class APITest(TembaTest):
         self.assertRaises(serializers.ValidationError, field.to_internal_value, {'kin': "HelloHello1"})  # also too long
         self.assertRaises(serializers.ValidationError, field.to_internal_value, {'eng': "HelloHello1"})  # base lang not provided
 
+        field = fields.MappedField({'I': "in", 'O': "out"})
+
+        self.assertEqual(field.to_representation('I'), "in")
+        self.assertIsNone(field.to_representation('X'))  # unmapped code
+
+        field = fields.MappedField({'I': "in", 'O': "out"}, source='direction')
+        field.bind('dir', serializers.Serializer())
+
+        self.assertEqual(field.source_attrs, ['direction'])
+        self.assertEqual(field.to_representation(field.get_attribute(Msg(direction='O'))), "out")
+
+        field = fields.AttachmentsField(source='test')
+
+        self.assertEqual(field.to_representation([]), [])
+        self.assertEqual(field.to_representation(Attachment.parse_all(['image/jpeg:http://example.com/test.jpg'])),
+                         [{'content_type': "image/jpeg", 'url': "http://example.com/test.jpg"}])
+
+        field = fields.MediaField(source='test')
+
+        self.assertIsNone(field.to_representation(None))
+        self.assertIsNone(field.to_representation([]))
+        self.assertEqual(field.to_representation(['image/jpeg:http://example.com/1.jpg',
+                                                  'audio/mp3:http://example.com/2.mp3']),
+                         'image/jpeg:http://example.com/1.jpg')
+
+    def test_msg_read_serializer(self):
+        label = Label.get_or_create(self.org, self.admin, "Spam")
+
+        msgs = [
+            self.create_msg(direction='I', msg_type='I', text="Hi", contact=self.frank, channel=self.twitter),
+            self.create_msg(direction='I', msg_type='F', text="Look", contact=self.joe, visibility='A',
+                            attachments=['image/jpeg:http://example.com/1.jpg', 'audio/mp3:http://example.com/2.mp3']),
+            self.create_msg(direction='O', msg_type='I', text="Hello", contact=self.joe, status='P'),
+            self.create_msg(direction='O', msg_type='V', text="Ivr", contact=self.joe, status='D',
+                            sent_on=timezone.now()),
+            self.create_msg(direction='O', msg_type='F', text="Surveys!", contact=self.joe, contact_urn=None,
+                            channel=None, status='S', sent_on=timezone.now()),
+        ]
+        label.toggle_label(msgs[:2], add=True)
+
+        serialized_ids = []
+        specialized_to_representation = MsgReadSerializer.to_representation
+
+        # our specialized method should give the same result as letting the REST framework iterate over the fields
+        def check_to_representation(serializer, msg):
+            data = specialized_to_representation(serializer, msg)
+            self.assertEqual(data, super(MsgReadSerializer, serializer).to_representation(msg))
+            serialized_ids.append(msg.id)
+            return data
+
+        url = reverse('api.v2.messages')
+        self.login(self.admin)
+
+        with patch.object(MsgReadSerializer, 'to_representation', new=check_to_representation):
+            self.fetchJSON(url, 'contact=%s' % self.joe.uuid)
+            self.fetchJSON(url, 'contact=%s' % self.frank.uuid)
+
+            with AnonymousOrg(self.org):
+                self.fetchJSON(url, 'contact=%s' % self.frank.uuid)
+
+        self.assertEqual(sorted(serialized_ids), sorted([m.id for m in msgs] + [msgs[0].id]))
+
     def test_authentication(self):
         def api_request(endpoint, token):
             return self.client.get(endpoint + '.json', content_type="application/json",
@@ -483,7 +545,9 @@ class APITest(TembaTest):
         BoundaryAlias.create(self.org, self.admin, self.state2, "East Prov")
         BoundaryAlias.create(self.org2, self.admin2, self.state1, "Other Org")  # shouldn't be returned
 
-        self.state1.simplified_geometry = GEOSGeometry('MULTIPOLYGON(((1 1, 1 -1, -1 -1, -1 1, 1 1)))')
+        self.state1.simplified_geometry = GEOSGeometry('MULTIPOLYGON(((30.0593884837221 -1.94428527355194, '
+                                                       '30.0593884837221 -1.0, 29.8923457891234 -1.0, '
+                                                       '30.0593884837221 -1.94428527355194)))')
         self.state1.save()
 
         # test without geometry
@@ -503,7 +567,10 @@ class APITest(TembaTest):
             'geometry': None
         })
 
-        # test without geometry
+        # test with geometry (which requires an extra query until geometries are cached)
+        with self.assertNumQueries(NUM_BASE_REQUEST_QUERIES + 4):
+            response = self.fetchJSON(url, 'geometry=true')
+
         with self.assertNumQueries(NUM_BASE_REQUEST_QUERIES + 3):
             response = self.fetchJSON(url, 'geometry=true')
 
@@ -518,17 +585,19 @@ class APITest(TembaTest):
                 'coordinates': [
                     [
                         [
-                            [1.0, 1.0],
-                            [1.0, -1.0],
-                            [-1.0, -1.0],
-                            [-1.0, 1.0],
-                            [1.0, 1.0]
+                            [30.0593884837221, -1.94428527355194],
+                            [30.0593884837221, -1.0],
+                            [29.8923457891234, -1.0],
+                            [30.0593884837221, -1.94428527355194]
                         ]
                     ]
                 ],
             }
         })
 
+        # coordinates shouldn't lose any precision compared to the stored geometry
+        self.assertEqual(response.json()['results'][0]['geometry'], json.loads(self.state1.simplified_geometry.geojson))
+
         # if org doesn't have a country, just return no results
         self.org.country = None
         self.org.save()
@@ -1039,7 +1108,7 @@ class APITest(TembaTest):
         hans = self.create_contact("Hans", "0788000004", org=self.org2)
 
         # no filtering
-        with self.assertNumQueries(NUM_BASE_REQUEST_QUERIES + 6):
+        with self.assertNumQueries(NUM_BASE_REQUEST_QUERIES + 5):
             response = self.fetchJSON(url)
 
         resp_json = response.json()
@@ -1232,6 +1301,13 @@ class APITest(TembaTest):
         self.assertEqual(response.status_code, 400)
         self.assertResponseError(response, 'urns', "URN belongs to another contact: tel:+250785555555")
 
+        # twitter handles belong to contacts who have a twitterid URN with that display
+        ContactURN.create(self.org, bobby, "twitterid:12345#therealbobby")
+
+        response = self.postJSON(url, None, {'name': "Robert", 'urns': ["twitter:therealbobby"]})
+        self.assertEqual(response.status_code, 400)
+        self.assertResponseError(response, 'urns', "URN belongs to another contact: twitter:therealbobby")
+
         # try to update a contact with non-existent UUID
         response = self.postJSON(url, 'uuid=ad6acad9-959b-4d70-b144-5de2891e4d00', {})
         self.assert404(response)
@@ -1648,7 +1724,7 @@ class APITest(TembaTest):
         self.create_flow(org=self.org2, name="Other")
 
         # no filtering
-        with self.assertNumQueries(NUM_BASE_REQUEST_QUERIES + 4):
+        with self.assertNumQueries(NUM_BASE_REQUEST_QUERIES + 3):
             response = self.fetchJSON(url)
 
         resp_json = response.json()
@@ -2163,7 +2239,7 @@ class APITest(TembaTest):
         frank_run2.refresh_from_db()
 
         # no filtering
-        with self.assertNumQueries(NUM_BASE_REQUEST_QUERIES + 8):
+        with self.assertNumQueries(NUM_BASE_REQUEST_QUERIES + 7):
             response = self.fetchJSON(url)
 
         self.assertEqual(response.status_code, 200)
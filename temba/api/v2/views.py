@@ -1,11 +1,15 @@
 from __future__ import absolute_import, unicode_literals
 
 import itertools
+import json
 import six
 
 from django import forms
 from django.contrib.auth import authenticate, login
-from django.db.models import Prefetch, Q
+from django.contrib.gis.db.models.functions import AsGeoJSON
+from django.core.cache import cache
+from django.db.models import Case, CharField, F, Prefetch, Q, Value, When
+from django.db.models.expressions import RawSQL
 from django.db import transaction
 from django.http import HttpResponse, JsonResponse
 from django.utils.translation import ugettext_lazy as _
@@ -22,9 +26,9 @@ from temba.api.models import APIToken, Resthook, ResthookSubscriber, WebHookEven
 from temba.campaigns.models import Campaign, CampaignEvent
 from temba.channels.models import Channel, ChannelEvent
 from temba.contacts.models import Contact, ContactURN, ContactGroup, ContactGroupCount, ContactField, URN
-from temba.flows.models import Flow, FlowRun, FlowStep, FlowStart, RuleSet
+from temba.flows.models import Flow, FlowRun, FlowRunCount, FlowStart, RuleSet
 from temba.locations.models import AdminBoundary, BoundaryAlias
-from temba.msgs.models import Broadcast, Msg, Label, LabelCount, SystemLabel
+from temba.msgs.models import Broadcast, Msg, Label, LabelCount, SystemLabel, PENDING, QUEUED
 from temba.utils import str_to_bool, json_date_to_datetime, splitting_getlist
 from uuid import UUID
 from .serializers import AdminBoundaryReadSerializer, BroadcastReadSerializer, BroadcastWriteSerializer
@@ -39,6 +43,9 @@ from .serializers import ResthookSubscriberWriteSerializer, WebHookEventReadSeri
 from ..models import APIPermission, SSLPermission
 from ..support import InvalidQueryError
 
+BOUNDARY_GEOMETRY_CACHE_KEY = 'boundary:%s:cache:geometry'
+BOUNDARY_GEOMETRY_CACHE_TTL = 60 * 15  # 15 minutes
+
 
 class RootView(views.APIView):
     """
@@ -333,9 +340,12 @@ class BaseAPIView(generics.GenericAPIView):
             raise InvalidQueryError("Value for %s must be a valid UUID" % name)
 
     def get_serializer_context(self):
+        org = self.request.user.get_org()
+
         context = super(BaseAPIView, self).get_serializer_context()
-        context['org'] = self.request.user.get_org()
+        context['org'] = org
         context['user'] = self.request.user
+        context['is_anon'] = org.is_anon  # checked for every URN we serialize
         return context
 
     def normalize_urn(self, value):
@@ -452,6 +462,9 @@ class WriteAPIMixin(object):
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     def render_write_response(self, write_output, context):
+        # prepare the object as we would a page of results, e.g. so group and label counts are cached
+        self.prepare_for_serialization([write_output])
+
         response_serializer = self.serializer_class(instance=write_output, context=context)
 
         # if we created a new object, notify caller by returning 201
@@ -567,11 +580,39 @@ class BoundariesEndpoint(ListAPIMixin, BaseAPIView):
             Prefetch('aliases', queryset=BoundaryAlias.objects.filter(org=org).order_by('name')),
         )
 
+        # never load geometries, if requested they're fetched as cached GeoJSON
+        queryset = queryset.defer('geometry', 'simplified_geometry', 'parent__geometry', 'parent__simplified_geometry')
+
         return queryset.select_related('parent')
 
+    def include_geometry(self):
+        return str_to_bool(self.request.query_params.get('geometry', 'false'))
+
+    def prepare_for_serialization(self, object_list):
+        if not self.include_geometry():
+            return
+
+        # boundary geometries only change when boundaries are re-imported, so we cache them already decoded
+        cache_keys = {b.id: BOUNDARY_GEOMETRY_CACHE_KEY % b.osm_id for b in object_list}
+        cached = cache.get_many(cache_keys.values())
+
+        missing_ids = [b.id for b in object_list if cache_keys[b.id] not in cached]
+        if missing_ids:
+            # use the same precision as GEOSGeometry.geojson rather than the default of 8 decimal places
+            geojsons = AdminBoundary.objects.filter(id__in=missing_ids)
+            geojsons = geojsons.annotate(geojson=AsGeoJSON('simplified_geometry', precision=15))
+            fetched = {cache_keys[b_id]: json.loads(geojson) if geojson else False  # False as None can't be cached
+                       for b_id, geojson in geojsons.values_list('id', 'geojson')}
+
+            cache.set_many(fetched, BOUNDARY_GEOMETRY_CACHE_TTL)
+            cached.update(fetched)
+
+        for boundary in object_list:
+            boundary.geometry_json = cached[cache_keys[boundary.id]] or None
+
     def get_serializer_context(self):
         context = super(BoundariesEndpoint, self).get_serializer_context()
-        context['include_geometry'] = str_to_bool(self.request.query_params.get('geometry', 'false'))
+        context['include_geometry'] = self.include_geometry()
         return context
 
     @classmethod
@@ -1347,18 +1388,12 @@ class ContactsEndpoint(ListAPIMixin, WriteAPIMixin, DeleteAPIMixin, BaseAPIView)
             else:
                 queryset = queryset.filter(pk=-1)
 
-        # use prefetch rather than select_related for foreign keys to avoid joins
-        queryset = queryset.prefetch_related(
-            Prefetch('all_groups', queryset=ContactGroup.user_groups.only('uuid', 'name').order_by('pk'),
-                     to_attr='prefetched_user_groups')
-        )
-
         return self.filter_before_after(queryset, 'modified_on')
 
     def prepare_for_serialization(self, object_list):
-        # initialize caches of all contact fields and URNs
+        # initialize caches of all URNs (field values are fetched by the serializer)
         org = self.request.user.get_org()
-        Contact.bulk_cache_initialize(org, object_list)
+        Contact.bulk_cache_initialize(org, object_list, with_fields=False)
 
     def get_serializer_context(self):
         """
@@ -1366,6 +1401,7 @@ class ContactsEndpoint(ListAPIMixin, WriteAPIMixin, DeleteAPIMixin, BaseAPIView)
         """
         context = super(ContactsEndpoint, self).get_serializer_context()
         context['contact_fields'] = ContactField.objects.filter(org=self.request.user.get_org(), is_active=True)
+        context['valid_field_keys'] = frozenset(f.key for f in context['contact_fields'])
         return context
 
     def get_object(self):
@@ -1810,10 +1846,13 @@ class FlowsEndpoint(ListAPIMixin, BaseAPIView):
         if uuid:
             queryset = queryset.filter(uuid=uuid)
 
-        queryset = queryset.prefetch_related('labels')
-
         return self.filter_before_after(queryset, 'modified_on')
 
+    def prepare_for_serialization(self, object_list):
+        run_counts = FlowRunCount.get_totals_by_flow(object_list)
+        for flow in object_list:
+            flow.run_counts = run_counts[flow]
+
     @classmethod
     def get_read_explorer(cls):
         return {
@@ -2300,6 +2339,11 @@ class MessagesEndpoint(ListAPIMixin, BaseAPIView):
             Prefetch('labels', queryset=Label.label_objects.only('uuid', 'name').order_by('pk')),
         )
 
+        # PENDING and QUEUED are same as far as users are concerned
+        queryset = queryset.annotate(effective_status=Case(
+            When(status=PENDING, then=Value(QUEUED)), default=F('status'), output_field=CharField()
+        ))
+
         # incoming folder gets sorted by 'modified_on'
         if self.request.query_params.get('folder', '').lower() == 'incoming':
             return self.filter_before_after(queryset, 'modified_on')
@@ -2785,6 +2829,14 @@ class RunsEndpoint(ListAPIMixin, BaseAPIView):
     exclusive_params = ('contact', 'flow')
     throttle_scope = 'v2.runs'
 
+    PATH_SQL = """
+        SELECT COALESCE(json_agg(json_build_object(
+            'node', s.step_uuid,
+            'time', to_char(s.arrived_on AT TIME ZONE 'UTC', 'YYYY-MM-DD"T"HH24:MI:SS.US"Z"')
+        ) ORDER BY s.arrived_on), '[]'::json)
+        FROM flows_flowstep s WHERE s.run_id = flows_flowrun.id
+    """
+
     def filter_queryset(self, queryset):
         params = self.request.query_params
         org = self.request.user.get_org()
@@ -2827,9 +2879,11 @@ class RunsEndpoint(ListAPIMixin, BaseAPIView):
             Prefetch('start', queryset=FlowStart.objects.only('uuid')),
             Prefetch('values'),
             Prefetch('values__ruleset', queryset=RuleSet.objects.only('uuid', 'label')),
-            Prefetch('steps', queryset=FlowStep.objects.only('run', 'step_uuid', 'arrived_on').order_by('arrived_on'))
         )
 
+        # build each run's path as JSON in the database rather than fetching and serializing every step
+        queryset = queryset.annotate(path_json=RawSQL(self.PATH_SQL, ()))
+
         return self.filter_before_after(queryset, 'modified_on')
 
     @classmethod
@@ -1005,6 +1005,28 @@ class Contact(TembaModel):
         contact.handle_update(attrs=updated_attrs, urns=updated_urns)
         return contact
 
+    @classmethod
+    def bulk_get_or_create(cls, org, user, urns):
+        """
+        Gets or creates a contact for each of the given URNs, looking up existing contacts for all of them in a single
+        query. Returns a list of contacts, in the same order as the URNs, with urn_objects mapping each contact's URN.
+        """
+        existing_urns = ContactURN.bulk_lookup(org, urns, org.get_country_code())
+
+        contacts = []
+        for urn in urns:
+            existing_urn = existing_urns.get(urn)
+
+            if existing_urn and existing_urn.contact:
+                contact = existing_urn.contact
+                contact.urn_objects = {urn: existing_urn}
+            else:
+                contact = cls.get_or_create(org, user, urns=[urn])
+
+            contacts.append(contact)
+
+        return contacts
+
     @classmethod
     def get_test_contact(cls, user):
         """
@@ -1561,44 +1583,45 @@ class Contact(TembaModel):
         self.save(update_fields=('is_active', 'modified_on', 'modified_by'))
 
     @classmethod
-    def bulk_cache_initialize(cls, org, contacts, for_show_only=False):
+    def bulk_cache_initialize(cls, org, contacts, for_show_only=False, with_fields=True):
         """
         Performs optimizations on our contacts to prepare them to send. This includes loading all our contact fields for
-        variable substitution.
+        variable substitution, unless with_fields is False in which case only URNs are loaded.
         """
         from temba.values.models import Value
 
         if not contacts:
             return
 
-        # get our contact fields
-        fields = ContactField.objects.filter(org=org)
-        if for_show_only:
-            fields = fields.filter(show_in_table=True)
-
         # build id maps to avoid re-fetching contact objects
-        key_map = {f.id: f.key for f in fields}
-
         contact_map = dict()
         for contact in contacts:
             contact_map[contact.id] = contact
             setattr(contact, '__urns', list())  # initialize URN list cache (setattr avoids name mangling or __urns)
 
-        # cache all field values
-        values = Value.objects.filter(contact_id__in=contact_map.keys(),
-                                      contact_field_id__in=key_map.keys()).select_related('contact_field', 'location_value')
-        for value in values:
-            contact = contact_map[value.contact_id]
-            field_key = key_map[value.contact_field_id]
-            cache_attr = '__field__%s' % field_key
-            setattr(contact, cache_attr, value)
-
-        # set missing fields as None attributes to avoid cache fetches later
-        for contact in contacts:
-            for field in fields:
-                cache_attr = '__field__%s' % field.key
-                if not hasattr(contact, cache_attr):
-                    setattr(contact, cache_attr, None)
+        if with_fields:
+            # get our contact fields
+            fields = ContactField.objects.filter(org=org)
+            if for_show_only:
+                fields = fields.filter(show_in_table=True)
+
+            key_map = {f.id: f.key for f in fields}
+
+            # cache all field values
+            values = Value.objects.filter(contact_id__in=contact_map.keys(),
+                                          contact_field_id__in=key_map.keys()).select_related('contact_field', 'location_value')
+            for value in values:
+                contact = contact_map[value.contact_id]
+                field_key = key_map[value.contact_field_id]
+                cache_attr = '__field__%s' % field_key
+                setattr(contact, cache_attr, value)
+
+            # set missing fields as None attributes to avoid cache fetches later
+            for contact in contacts:
+                for field in fields:
+                    cache_attr = '__field__%s' % field.key
+                    if not hasattr(contact, cache_attr):
+                        setattr(contact, cache_attr, None)
 
         # cache all URN values (a priority ordered list on each contact)
         urns = ContactURN.objects.filter(contact__in=contact_map.keys()).order_by('contact', '-priority', 'pk')
@@ -2023,6 +2046,40 @@ class ContactURN(models.Model):
 
         return existing
 
+    @classmethod
+    def bulk_lookup(cls, org, urns_as_strings, country_code=None, normalize=True):
+        """
+        Looks up existing URNs for multiple formatted URN strings in a single query, matching twitter handles as lookup
+        does. Returns a dict of the given URN strings to URNs, omitting those with no existing URN.
+        """
+        lookups = []
+        for urn_as_string in urns_as_strings:
+            normalized = URN.normalize(urn_as_string, country_code) if normalize else urn_as_string
+            (scheme, path, display) = URN.to_parts(normalized)
+            lookups.append((urn_as_string, URN.identity(normalized), scheme, path))
+
+        identities = {identity for urn_as_string, identity, scheme, path in lookups}
+        handles = {path for urn_as_string, identity, scheme, path in lookups if scheme == TWITTER_SCHEME}
+
+        existing = cls.objects.filter(org=org).filter(Q(identity__in=identities) | Q(scheme=TWITTERID_SCHEME,
+                                                                                     display__in=handles))
+        by_identity = {}
+        by_handle = {}
+        for existing_urn in existing.select_related('contact'):
+            by_identity[existing_urn.identity] = existing_urn
+            if existing_urn.scheme == TWITTERID_SCHEME:
+                by_handle[existing_urn.display] = existing_urn
+
+        found = {}
+        for urn_as_string, identity, scheme, path in lookups:
+            # like lookup, a twitterid URN with a matching display takes precedence for twitter handles
+            existing_urn = by_handle.get(path) if scheme == TWITTER_SCHEME else None
+            existing_urn = existing_urn or by_identity.get(identity)
+            if existing_urn:
+                found[urn_as_string] = existing_urn
+
+        return found
+
     def update_auth(self, auth):
         if auth and auth != self.auth:
             self.auth = auth
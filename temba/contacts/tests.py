@@ -644,6 +644,33 @@ class ContactTest(TembaTest):
         jimmy = Contact.get_or_create(self.org, self.user, name="Jimmy", urns=['tel:+250788112233', 'tel:0788112233'])
         self.assertEqual(1, jimmy.urns.all().count())
 
+    def test_bulk_get_or_create(self):
+        frank_twitterid = ContactURN.create(self.org, self.frank, "twitterid:12345#therealfrank")
+
+        contacts = Contact.bulk_get_or_create(self.org, self.user, ['tel:+250781111111', 'tel:0782222222',
+                                                                    'twitter:blow80', 'tel:+250788000001',
+                                                                    'twitter:therealfrank'])
+
+        # existing contacts are returned for existing URNs, with their URN objects
+        self.assertEqual(contacts[0], self.joe)
+        self.assertEqual(contacts[0].urn_objects, {'tel:+250781111111': self.joe.get_urn(TEL_SCHEME)})
+        self.assertEqual(contacts[1], self.frank)
+        self.assertEqual(contacts[1].urn_objects, {'tel:0782222222': self.frank.get_urn(TEL_SCHEME)})
+        self.assertEqual(contacts[2], self.joe)
+        self.assertEqual(contacts[2].urn_objects['twitter:blow80'], self.joe.get_urn(TWITTER_SCHEME))
+
+        # and new contacts are created for new URNs
+        self.assertTrue(contacts[3].is_new)
+        self.assertEqual(contacts[3].get_urn(TEL_SCHEME).path, '+250788000001')
+
+        # twitter handles also match twitterid URNs by their display
+        self.assertEqual(contacts[4], self.frank)
+        self.assertEqual(contacts[4].urn_objects, {'twitter:therealfrank': frank_twitterid})
+
+        existing = ContactURN.bulk_lookup(self.org, ['twitter:therealfrank', 'tel:+250781111111', 'tel:+250789999999'])
+        self.assertEqual(existing, {'twitter:therealfrank': frank_twitterid,
+                                    'tel:+250781111111': self.joe.get_urn(TEL_SCHEME)})
+
     def test_get_test_contact(self):
         test_contact_admin = Contact.get_test_contact(self.admin)
         self.assertTrue(test_contact_admin.is_test)
@@ -4052,18 +4052,32 @@ class FlowRunCount(SquashableModel):
 
     @classmethod
     def get_totals(cls, flow):
-        totals = list(cls.objects.filter(flow=flow).values_list('exit_type').annotate(replies=Sum('count')))
-        totals = {t[0]: t[1] for t in totals}
+        return cls.get_totals_by_flow([flow])[flow]
 
-        # for convenience, ensure dict contains all possible states
+    @classmethod
+    def get_totals_by_flow(cls, flows):
+        """
+        Gets totals by exit type for all the given flows in a single query
+        """
+        counts = cls.objects.filter(flow__in=flows).values_list('flow_id', 'exit_type').annotate(replies=Sum('count'))
+        counts_by_flow_id = defaultdict(dict)
+        for flow_id, exit_type, count in counts:
+            counts_by_flow_id[flow_id][exit_type] = count
+
+        # for convenience, ensure each dict contains all possible states
         all_states = (None, FlowRun.EXIT_TYPE_COMPLETED, FlowRun.EXIT_TYPE_EXPIRED, FlowRun.EXIT_TYPE_INTERRUPTED)
-        totals = {s: totals.get(s, 0) for s in all_states}
 
-        # we record active runs as exit_type=None but replace with actual constant for clarity
-        totals[FlowRun.STATE_ACTIVE] = totals[None]
-        del totals[None]
+        totals_by_flow = {}
+        for flow in flows:
+            flow_counts = counts_by_flow_id.get(flow.id, {})
+            totals = {s: flow_counts.get(s, 0) for s in all_states}
+
+            # we record active runs as exit_type=None but replace with actual constant for clarity
+            totals[FlowRun.STATE_ACTIVE] = totals.pop(None)
+
+            totals_by_flow[flow] = totals
 
-        return totals
+        return totals_by_flow
 
     def __str__(self):  # pragma: needs cover
         return "RunCount[%d:%s:%d]" % (self.flow_id, self.exit_type, self.count)
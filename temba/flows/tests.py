@@ -4920,6 +4920,10 @@ class FlowsTest(FlowFileTest):
         self.assertEqual(FlowRunCount.objects.all().count(), 3)
         self.assertEqual(FlowRunCount.get_totals(flow2), {'A': 0, 'C': 0, 'E': 0, 'I': 9})
         self.assertEqual(FlowRunCount.get_totals(flow), {'A': 3, 'C': 0, 'E': 3, 'I': 0})
+        self.assertEqual(FlowRunCount.get_totals_by_flow([flow, flow2]), {
+            flow: {'A': 3, 'C': 0, 'E': 3, 'I': 0},
+            flow2: {'A': 0, 'C': 0, 'E': 0, 'I': 9}
+        })
 
         max_id = FlowRunCount.objects.all().order_by('-id').first().id
 